@@ -12,49 +12,195 @@ License: MIT
 import json
 import os
 import re
+import string
+import calendar
 import fcntl
+import functools
+import hashlib
+import threading
+import time
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
-from datetime import datetime, timezone
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple, FrozenSet, Iterator
+
+try:
+    import orjson  # Optional: C JSON codec, several times faster on large maps
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack  # Optional: binary map format (OPENCLAW_IDENTITY_FORMAT=msgpack)
+except ImportError:
+    msgpack = None
+
+# Precompiled patterns (hot path: every resolve/add/remove goes through these)
+_NUMBER_RE = re.compile(r'\+?\d{7,}')
+_CONTACT_LINE_RE = re.compile(r'^[^\n]*(?:Contact|WhatsApp|Telegram|Phone|Mobile|Other)[^\n]*', re.MULTILINE)
+_NAME_RE = re.compile(r'\*\*Name:\*\*\s+(.+)')
+
+# Canonical ID whitelist as bytes.translate tables: one C-level pass maps
+# A-Z to a-z and deletes every other byte outside [a-z0-9-_]
+_SANITIZE_ALLOWED = (string.ascii_lowercase + string.digits + '-_').encode('ascii')
+_SANITIZE_LOWER = bytes.maketrans(string.ascii_uppercase.encode('ascii'), string.ascii_lowercase.encode('ascii'))
+_SANITIZE_DELETE = bytes(b for b in range(256) if b not in _SANITIZE_ALLOWED and not 65 <= b <= 90)
+
+# Parsed identity maps keyed by path: (stat signature, map, sha256 of file bytes).
+# The signature (inode, mtime_ns, size) picks up writes from other processes
+# on the next load; the digest lets saves skip rewriting identical content.
+_MAP_CACHE: Dict[Path, Tuple[Tuple[int, int, int], Dict, bytes]] = {}
+
+# Identity map location per workspace, so public API calls skip re-probing
+_PATH_CACHE: Dict[Path, Path] = {}
+
+# Parsed USER.md per path: (stat signature, owner numbers, owner first name)
+_OWNER_CACHE: Dict[Path, Tuple[Tuple[int, int, int], FrozenSet[str], Optional[str]]] = {}
+
+# Map paths whose write lock the current thread holds (lets a holder's own save
+# reuse the lock, and makes nested read-modify-writes raise instead of losing data)
+_LOCK_STATE = threading.local()
+
+# In-memory-only keys added to loaded maps by _index_identity_map
+_DERIVED_KEYS = ("channel_index", "owner_id")
+
+def _json_loads(raw: bytes) -> Dict:
+    """Parse identity map bytes (orjson when installed, stdlib json otherwise)."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def _json_dumps(data: Dict) -> bytes:
+    """
+    Serialize identity map to indented, key-sorted UTF-8 JSON bytes.
+    
+    Both codecs emit identical bytes, so installing or removing orjson
+    doesn't make the unchanged-content check force a rewrite.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+    return json.dumps(data, indent=2, sort_keys=True, ensure_ascii=False).encode('utf-8')
+
+def _map_format() -> str:
+    """Format for saving the map: "msgpack" if requested and installed, else "json"."""
+    if os.getenv("OPENCLAW_IDENTITY_FORMAT", "json") == "msgpack" and msgpack is not None:
+        return "msgpack"
+    return "json"
+
+def _is_msgpack_map(raw: bytes) -> bool:
+    """True if raw starts with a msgpack map header (fixmap, map16 or map32)."""
+    return bool(raw) and (0x80 <= raw[0] <= 0x8f or raw[0] in (0xde, 0xdf))
+
+def _decode_map(raw: bytes) -> Dict:
+    """
+    Parse identity map bytes, sniffing JSON vs msgpack from the first byte.
+    
+    Only a msgpack map header selects msgpack; anything else (including
+    damaged or BOM-prefixed files) goes through the JSON parser and its
+    ValueError. Loading never depends on OPENCLAW_IDENTITY_FORMAT, so
+    switching formats (or the variable) can't make an existing map
+    unreadable.
+    """
+    if not _is_msgpack_map(raw):
+        return _json_loads(raw)
+    if msgpack is None:
+        # Don't fall back to an empty map: the next save would wipe it
+        raise RuntimeError("identity map is msgpack-encoded but msgpack is not installed")
+    return msgpack.unpackb(raw, raw=False)
+
+def _encode_map(data: Dict) -> bytes:
+    """Serialize identity map in the configured format (see _map_format)."""
+    if _map_format() == "msgpack":
+        return msgpack.packb(data, use_bin_type=True)
+    return _json_dumps(data)
+
+def _now_ts() -> int:
+    """Current time as integer epoch seconds (stored as created_ts/updated_ts)."""
+    return int(time.time())
+
+def _iso_from_ts(ts: int) -> str:
+    """Format epoch seconds as ISO-8601 UTC with a Z suffix (for display only)."""
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(ts))
+
+def _migrate_timestamps(user_data: Dict):
+    """
+    Convert legacy ISO created_at/updated_at strings to epoch *_ts ints (in place).
+    
+    Accepts both "...Z" and the older malformed "...+00:00Z" forms; values
+    that don't parse are left untouched.
+    """
+    for field in ("created", "updated"):
+        iso = user_data.get(f"{field}_at")
+        if not isinstance(iso, str) or f"{field}_ts" in user_data:
+            continue
+        try:
+            ts = calendar.timegm(time.strptime(iso[:19], '%Y-%m-%dT%H:%M:%S'))
+        except ValueError:
+            continue
+        user_data[f"{field}_ts"] = ts
+        del user_data[f"{field}_at"]
+
+def _fsync_enabled() -> bool:
+    """fsync on save unless OPENCLAW_IDENTITY_FSYNC=0 (rename stays atomic either way)."""
+    return os.getenv("OPENCLAW_IDENTITY_FSYNC", "1") != "0"
+
+@functools.lru_cache(maxsize=16)
+def _resolve_workspace(spec: str, cwd: Optional[str]) -> Path:
+    """
+    Memoized realpath of a workspace spec.
+    
+    cwd is part of the key only for relative specs (None otherwise), so a
+    chdir can't return a stale result for them. Symlinks are resolved once
+    per process.
+    """
+    return Path(spec).resolve()
 
 # Default workspace detection
 def _get_workspace(workspace: Optional[str] = None) -> Path:
     """Get workspace path (auto-detect if not provided)."""
-    if workspace:
-        return Path(workspace).resolve()
-    
-    # Try environment variable
-    if os.getenv("OPENCLAW_WORKSPACE"):
-        return Path(os.getenv("OPENCLAW_WORKSPACE")).resolve()
+    # Explicit argument first, then environment variable
+    spec = workspace or os.getenv("OPENCLAW_WORKSPACE")
+    if spec:
+        cwd = None if os.path.isabs(spec) else os.getcwd()
+        return _resolve_workspace(spec, cwd)
     
     # Default: current directory
     return Path.cwd()
 
 def _get_identity_map_path(workspace: Path) -> Path:
-    """Get identity map file path."""
-    # Try data/identity-map.json first (new standard)
-    data_path = workspace / "data" / "identity-map.json"
-    if data_path.exists():
-        return data_path
-    
-    # Fallback: memory/identity-map.json (legacy)
-    memory_path = workspace / "memory" / "identity-map.json"
-    if memory_path.exists():
-        return memory_path
+    """Get identity map file path (probed once per workspace, then cached)."""
+    cached = _PATH_CACHE.get(workspace)
+    if cached is not None:
+        return cached
     
-    # Default: create in data/
-    data_path.parent.mkdir(parents=True, exist_ok=True)
-    return data_path
+    # Try data/identity-map.json first (new standard)
+    map_path = workspace / "data" / "identity-map.json"
+    if not map_path.exists():
+        # Fallback: memory/identity-map.json (legacy)
+        memory_path = workspace / "memory" / "identity-map.json"
+        if memory_path.exists():
+            map_path = memory_path
+    
+    # Default: data/ (created on first save)
+    _PATH_CACHE[workspace] = map_path
+    return map_path
 
+@functools.lru_cache(maxsize=1024)
 def _sanitize_canonical_id(canonical_id: str) -> str:
     """
     Sanitize canonical ID to prevent path traversal and injection attacks.
     
     Only allows: lowercase letters, numbers, hyphens, underscores
     Max length: 64 characters
+    
+    Pure, so results are memoized (invalid IDs aren't cached; they raise
+    every time).
     """
-    # Remove all non-alphanumeric except - and _
-    sanitized = re.sub(r'[^a-z0-9\-_]', '', canonical_id.lower())
+    # Lowercase and remove all non-alphanumeric except - and _ (single C-level
+    # pass). Non-ASCII input is lowercased by str.lower first, since some
+    # characters lowercase to ASCII (e.g. the Kelvin sign to "k")
+    ascii_id = canonical_id
+    if not ascii_id.isascii():
+        ascii_id = ascii_id.lower().encode('ascii', 'ignore').decode('ascii')
+    sanitized = ascii_id.encode('ascii').translate(_SANITIZE_LOWER, _SANITIZE_DELETE).decode('ascii')
     
     # Remove leading/trailing hyphens or underscores
     sanitized = sanitized.strip('-_')
@@ -68,28 +214,148 @@ def _sanitize_canonical_id(canonical_id: str) -> str:
     
     return sanitized
 
-def _load_owner_numbers(workspace: Path) -> List[str]:
-    """Load owner contact numbers from USER.md."""
+def _load_owner_info(workspace: Path) -> Tuple[FrozenSet[str], Optional[str]]:
+    """
+    Load owner contact numbers and first name from USER.md.
+    
+    Parsed once per file version (cached by stat signature), since USER.md
+    rarely changes but is consulted for every unmapped resolve.
+    
+    Returns:
+        (frozenset of contact numbers, first word of **Name:** or None)
+    """
     user_md = workspace / "USER.md"
-    if not user_md.exists():
-        return []
+    try:
+        signature = _stat_signature(os.stat(user_md))
+    except FileNotFoundError:
+        return frozenset(), None
+    
+    cached = _OWNER_CACHE.get(user_md)
+    if cached and cached[0] == signature:
+        return cached[1], cached[2]
     
     content = user_md.read_text()
-    numbers = []
     
-    # Extract numbers from contact-related lines
-    for line in content.splitlines():
-        if any(kw in line for kw in ["Contact", "WhatsApp", "Telegram", "Phone", "Mobile", "Other"]):
-            # Extract all patterns: +digits or just long digit sequences
-            # Handles: +1234567890, 123456789, +9876543210, +5555555555
-            matches = re.findall(r'\+?\d{7,}', line)
-            numbers.extend(matches)
+    # Extract numbers from contact-related lines: one scan picks the lines,
+    # one scan pulls every +digits / long digit run out of them
+    # Handles: +1234567890, 123456789, +9876543210, +5555555555
+    contact_lines = "\n".join(_CONTACT_LINE_RE.findall(content))
+    numbers = frozenset(_NUMBER_RE.findall(contact_lines))
+    
+    name_match = _NAME_RE.search(content)
+    # A whitespace-only **Name:** value (e.g. at EOF) has no first word
+    name_parts = name_match.group(1).split() if name_match else []
+    owner_name = name_parts[0] if name_parts else None
+    
+    _OWNER_CACHE[user_md] = (signature, numbers, owner_name)
+    return numbers, owner_name
+
+def _stat_signature(st: os.stat_result) -> Tuple[int, int, int]:
+    """Cache validation key for a file (each atomic save swaps in a new inode)."""
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def _index_identity_map(data: Dict) -> Dict:
+    """
+    Build in-memory lookup structures for an identity map (in place).
     
-    return list(set(numbers))  # Deduplicate
+    Turns each identity's "channels" into a set (O(1) membership; saved
+    back as a sorted list) and adds "channel_index" ("channel:user_id" ->
+    canonical_id, first mapping wins like the original linear scan) and
+    "owner_id" (owner canonical ID or None). Neither key is persisted by
+    _save_identity_map.
+    """
+    channel_index = {}
+    owner_id = None
+    for canonical_id, user_data in data["identities"].items():
+        _migrate_timestamps(user_data)
+        channels = user_data["channels"] = set(user_data.get("channels", ()))
+        for channel_id in channels:
+            channel_index.setdefault(channel_id, canonical_id)
+        if owner_id is None and user_data.get("is_owner"):
+            owner_id = canonical_id
+    data["channel_index"] = channel_index
+    data["owner_id"] = owner_id
+    return data
+
+def _unindex_channel(identity_map: Dict, channel_id: str, canonical_id: str):
+    """Drop channel_id from the reverse index after removal from canonical_id."""
+    channel_index = identity_map["channel_index"]
+    if channel_index.get(channel_id) != canonical_id:
+        return
+    del channel_index[channel_id]
+    
+    # Rare: another identity also lists this channel, fall back to it
+    for other_id, user_data in identity_map["identities"].items():
+        if channel_id in user_data.get("channels", ()):
+            channel_index[channel_id] = other_id
+            break
+
+def _empty_identity_map() -> Dict:
+    """Return a fresh, indexed, empty identity map."""
+    return _index_identity_map({"version": "1.0", "identities": {}})
+
+def _copy_identity_map(data: Dict) -> Dict:
+    """Copy identity map deep enough that callers can mutate it freely."""
+    copied = dict(data)
+    copied["identities"] = {
+        canonical_id: dict(user_data, channels=set(user_data.get("channels", ())))
+        for canonical_id, user_data in data["identities"].items()
+    }
+    if "channel_index" in data:
+        copied["channel_index"] = dict(data["channel_index"])
+    return copied
+
+def _serializable_identities(identities: Dict) -> Dict:
+    """Identities with channel sets turned into sorted lists (stable JSON)."""
+    return {
+        canonical_id: dict(user_data, channels=sorted(user_data.get("channels", ())))
+        for canonical_id, user_data in identities.items()
+    }
+
+def _peek_identity_map(workspace: Path) -> Dict:
+    """
+    Return the cached identity map for read-only use (no copy).
+    
+    Parsed maps are cached in-process and revalidated with a single stat,
+    so repeated reads of an unchanged file skip the open/parse cycle.
+    The result is shared: callers must not mutate it (use
+    _load_identity_map for a private copy).
+    """
+    map_path = _get_identity_map_path(workspace)
+    
+    try:
+        signature = _stat_signature(os.stat(map_path))
+    except FileNotFoundError:
+        # Initialize empty map
+        return _empty_identity_map()
+    
+    cached = _MAP_CACHE.get(map_path)
+    if cached and cached[0] == signature:
+        return cached[1]
+    
+    try:
+        # No lock needed: saves rename a fully written temp file into place,
+        # so this handle sees either the old or the new map, never a mix
+        with open(map_path, 'rb') as f:
+            raw = f.read()
+            signature = _stat_signature(os.fstat(f.fileno()))
+        data = _decode_map(raw)
+        
+        # Validate structure
+        if "identities" not in data:
+            data = {"version": "1.0", "identities": {}}
+        
+        _MAP_CACHE[map_path] = (signature, _index_identity_map(data), hashlib.sha256(raw).digest())
+        return data
+    except (ValueError, IOError):
+        return _empty_identity_map()
 
 def _load_identity_map(workspace: Path) -> Dict:
     """
-    Load identity map with file locking (thread-safe read).
+    Load a private, mutable copy of the identity map.
+    
+    Lock-free and safe against concurrent atomic saves; see
+    _peek_identity_map for caching.
     
     Returns:
         dict with structure:
@@ -100,61 +366,168 @@ def _load_identity_map(workspace: Path) -> Dict:
                     "canonical_id": str,
                     "is_owner": bool,
                     "display_name": str,
-                    "channels": [list of "channel:user_id"],
-                    "created_at": ISO timestamp,
-                    "updated_at": ISO timestamp
+                    "channels": {set of "channel:user_id"},  # sorted list on disk
+                    "created_ts": epoch seconds,
+                    "updated_ts": epoch seconds
                 }
-            }
+            },
+            "channel_index": {"channel:user_id": canonical_id},  # in-memory only
+            "owner_id": owner canonical_id or None  # in-memory only
         }
     """
-    map_path = _get_identity_map_path(workspace)
+    return _copy_identity_map(_peek_identity_map(workspace))
+
+def _held_locks() -> set:
+    """Map paths whose write lock the current thread holds."""
+    held = getattr(_LOCK_STATE, "held", None)
+    if held is None:
+        held = _LOCK_STATE.held = set()
+    return held
+
+def _check_lock_not_held(map_path: Path):
+    """
+    Refuse a new read-modify-write while this thread already holds the lock.
     
-    if not map_path.exists():
-        # Initialize empty map
-        return {"version": "1.0", "identities": {}}
+    The caller would load and save its own copy, which the enclosing
+    IdentitySession (or other holder) then overwrites with its older copy
+    on exit, silently losing the update.
+    """
+    if map_path in _held_locks():
+        raise RuntimeError(
+            f"identity map {map_path} is already locked by this thread "
+            "(use the open IdentitySession instead of a nested mutation)"
+        )
+
+@contextmanager
+def _identity_map_lock(map_path: Path, reentrant: bool = False) -> Iterator[None]:
+    """
+    Exclusive cross-process lock for read-modify-write of the identity map.
     
+    Held on a sidecar <map>.lock file for the whole load -> mutate -> save
+    sequence, so concurrent writers (threads or processes) can't clobber
+    each other's updates. The map file itself can't carry the lock because
+    every save replaces its inode.
+    
+    Only internal steps of a holder's own sequence (the final save) pass
+    reentrant=True; a second read-modify-write in the same thread raises
+    RuntimeError instead of deadlocking or losing updates.
+    """
+    held = _held_locks()
+    if map_path in held:
+        if not reentrant:
+            _check_lock_not_held(map_path)
+        yield
+        return
+    
+    lock_path = map_path.with_suffix('.lock')
+    flags = os.O_RDWR | os.O_CREAT
     try:
-        with open(map_path, 'r') as f:
-            # Shared lock for reading
-            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
-            try:
-                data = json.load(f)
-            finally:
-                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-        
-        # Validate structure
-        if "identities" not in data:
-            data = {"version": "1.0", "identities": {}}
-        
-        return data
-    except (json.JSONDecodeError, IOError):
-        return {"version": "1.0", "identities": {}}
+        fd = os.open(lock_path, flags, 0o644)
+    except FileNotFoundError:
+        map_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(lock_path, flags, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        held.add(map_path)
+        try:
+            yield
+        finally:
+            held.discard(map_path)
+    finally:
+        # Closing the descriptor releases the flock
+        os.close(fd)
+
+def _write_all(fd: int, payload: bytes):
+    """os.write until the whole payload is on disk (one syscall in practice)."""
+    view = memoryview(payload)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+def _fsync(fd: int):
+    """
+    Flush a file descriptor to stable storage.
+    
+    On macOS fsync() only reaches the drive's cache; F_FULLFSYNC forces a
+    real flush. Falls back to fsync() where F_FULLFSYNC is unavailable.
+    """
+    if hasattr(fcntl, "F_FULLFSYNC"):
+        try:
+            fcntl.fcntl(fd, fcntl.F_FULLFSYNC)
+            return
+        except OSError:
+            pass
+    os.fsync(fd)
+
+def _fsync_dir(directory: Path):
+    """fsync a directory so a rename inside it survives a crash."""
+    dir_fd = os.open(directory, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    try:
+        _fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
 
 def _save_identity_map(data: Dict, workspace: Path):
     """
-    Save identity map with file locking (thread-safe write).
+    Save identity map under the write lock (thread/process-safe).
+    
+    Callers doing read-modify-write should hold _identity_map_lock around
+    their load as well, so the saved map is based on the latest state.
+    No-op when the serialized map is byte-identical to the file on disk.
     """
     map_path = _get_identity_map_path(workspace)
-    map_path.parent.mkdir(parents=True, exist_ok=True)
     
-    # Atomic write with exclusive lock
-    temp_path = map_path.with_suffix('.tmp')
-    try:
-        with open(temp_path, 'w') as f:
-            # Exclusive lock for writing
-            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    # Derived lookup structures are rebuilt on load, never persisted
+    persisted = {k: v for k, v in data.items() if k not in _DERIVED_KEYS}
+    persisted["identities"] = _serializable_identities(persisted["identities"])
+    payload = _encode_map(persisted)
+    digest = hashlib.sha256(payload).digest()
+    
+    # Skip the write (and fsync) if the file still holds exactly these bytes
+    cached = _MAP_CACHE.get(map_path)
+    if cached and cached[2] == digest:
+        try:
+            if _stat_signature(os.stat(map_path)) == cached[0]:
+                return
+        except FileNotFoundError:
+            pass
+    
+    with _identity_map_lock(map_path, reentrant=True):
+        # Atomic write: temp file + rename (the lock makes the temp name safe)
+        durable = _fsync_enabled()
+        temp_path = map_path.with_suffix('.tmp')
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+        try:
             try:
-                json.dump(data, f, indent=2, sort_keys=True)
-                f.flush()
-                os.fsync(f.fileno())
+                fd = os.open(temp_path, flags, 0o644)
+            except FileNotFoundError:
+                # First save in this workspace: create data/ and retry
+                map_path.parent.mkdir(parents=True, exist_ok=True)
+                fd = os.open(temp_path, flags, 0o644)
+            try:
+                _write_all(fd, payload)
+                if durable:
+                    _fsync(fd)
+                # Rename keeps inode/mtime/size, so this matches the final file
+                signature = _stat_signature(os.fstat(fd))
             finally:
-                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                os.close(fd)
+            
+            # Atomic rename
+            os.replace(temp_path, map_path)
+        except BaseException:
+            # Don't leave a partial temp file behind
+            try:
+                os.unlink(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
         
-        # Atomic rename
-        temp_path.replace(map_path)
-    finally:
-        if temp_path.exists():
-            temp_path.unlink()
+        # Make the rename itself durable (directory entry update)
+        if durable:
+            _fsync_dir(map_path.parent)
+        
+        _MAP_CACHE[map_path] = (signature, _index_identity_map(_copy_identity_map(persisted)), digest)
 
 def resolve_canonical_id(
     channel: str,
@@ -178,62 +551,125 @@ def resolve_canonical_id(
     Auto-registers owner numbers from workspace/USER.md if provided.
     """
     ws = _get_workspace(workspace)
-    identity_map = _load_identity_map(ws)
     
     # Build channel ID
     channel_id = f"{channel}:{provider_user_id}"
     
-    # Check if already mapped
-    for canonical_id, user_data in identity_map["identities"].items():
-        if channel_id in user_data.get("channels", []):
-            return canonical_id
+    # Fast path: already mapped -> one dict lookup on the shared cached map
+    # (no copy, no USER.md read)
+    canonical_id = _peek_identity_map(ws)["channel_index"].get(channel_id)
+    if canonical_id:
+        return canonical_id
     
     # Auto-registration for owner
     if owner_numbers is None:
-        owner_numbers = _load_owner_numbers(ws)
+        owner_numbers = _load_owner_info(ws)[0]
     
     if provider_user_id in owner_numbers:
-        # Find or create owner canonical ID
-        owner_canonical = None
-        for canonical_id, user_data in identity_map["identities"].items():
-            if user_data.get("is_owner"):
-                owner_canonical = canonical_id
-                break
-        
-        if not owner_canonical:
-            # Create owner identity (use "owner" or first name from USER.md)
-            user_md = ws / "USER.md"
-            if user_md.exists():
-                content = user_md.read_text()
-                name_match = re.search(r'\*\*Name:\*\*\s+(.+)', content)
-                if name_match:
-                    owner_canonical = _sanitize_canonical_id(name_match.group(1).split()[0])
-                else:
-                    owner_canonical = "owner"
-            else:
-                owner_canonical = "owner"
+        with _identity_map_lock(_get_identity_map_path(ws)):
+            # Re-read under the lock: another writer may have registered it
+            identity_map = _load_identity_map(ws)
+            canonical_id = identity_map["channel_index"].get(channel_id)
+            if canonical_id:
+                return canonical_id
             
-            # Create owner entry
-            identity_map["identities"][owner_canonical] = {
-                "canonical_id": owner_canonical,
-                "is_owner": True,
-                "display_name": owner_canonical.capitalize(),
-                "channels": [],
-                "created_at": datetime.now(timezone.utc).isoformat() + "Z",
-                "updated_at": datetime.now(timezone.utc).isoformat() + "Z"
-            }
-        
-        # Add channel to owner
-        if channel_id not in identity_map["identities"][owner_canonical]["channels"]:
-            identity_map["identities"][owner_canonical]["channels"].append(channel_id)
-            identity_map["identities"][owner_canonical]["updated_at"] = datetime.now(timezone.utc).isoformat() + "Z"
+            owner_canonical = _register_owner_channel(identity_map, channel_id, ws)
             _save_identity_map(identity_map, ws)
-        
         return owner_canonical
     
     # Unmapped stranger
     return f"stranger:{channel}:{provider_user_id}"
 
+def _register_owner_channel(identity_map: Dict, channel_id: str, workspace: Path) -> str:
+    """Attach channel_id to the owner identity (creating it if needed), without saving."""
+    now = _now_ts()
+    
+    # Find or create owner canonical ID
+    owner_canonical = identity_map["owner_id"]
+    
+    if not owner_canonical:
+        # Create owner identity (use "owner" or first name from USER.md)
+        owner_name = _load_owner_info(workspace)[1]
+        owner_canonical = _sanitize_canonical_id(owner_name) if owner_name else "owner"
+        
+        # Create owner entry
+        identity_map["identities"][owner_canonical] = {
+            "canonical_id": owner_canonical,
+            "is_owner": True,
+            "display_name": owner_canonical.capitalize(),
+            "channels": set(),
+            "created_ts": now,
+            "updated_ts": now
+        }
+        identity_map["owner_id"] = owner_canonical
+    
+    # Add channel to owner
+    owner_data = identity_map["identities"][owner_canonical]
+    if channel_id not in owner_data["channels"]:
+        owner_data["channels"].add(channel_id)
+        identity_map["channel_index"].setdefault(channel_id, owner_canonical)
+        owner_data["updated_ts"] = now
+    
+    return owner_canonical
+
+def _add_channel_inplace(
+    identity_map: Dict,
+    canonical_id: str,
+    channel: str,
+    provider_user_id: str,
+    display_name: Optional[str] = None
+) -> bool:
+    """
+    Add channel mapping to a loaded identity map without saving.
+    
+    canonical_id must already be sanitized. Returns True if the map changed.
+    """
+    channel_id = f"{channel}:{provider_user_id}"
+    user_data = identity_map["identities"].get(canonical_id)
+    
+    # Nothing to do if channel already present
+    if user_data and channel_id in user_data["channels"]:
+        return False
+    
+    now = _now_ts()
+    
+    # Create user if doesn't exist
+    if user_data is None:
+        user_data = identity_map["identities"][canonical_id] = {
+            "canonical_id": canonical_id,
+            "is_owner": False,
+            "display_name": display_name or canonical_id.capitalize(),
+            "channels": set(),
+            "created_ts": now,
+            "updated_ts": now
+        }
+    
+    user_data["channels"].add(channel_id)
+    identity_map["channel_index"].setdefault(channel_id, canonical_id)
+    user_data["updated_ts"] = now
+    return True
+
+def _remove_channel_inplace(
+    identity_map: Dict,
+    canonical_id: str,
+    channel: str,
+    provider_user_id: str
+) -> bool:
+    """
+    Remove channel mapping from a loaded identity map without saving.
+    
+    canonical_id must already be sanitized. Returns True if the map changed.
+    """
+    channel_id = f"{channel}:{provider_user_id}"
+    
+    user_data = identity_map["identities"].get(canonical_id)
+    if not user_data or channel_id not in user_data["channels"]:
+        return False
+    user_data["channels"].discard(channel_id)
+    _unindex_channel(identity_map, channel_id, canonical_id)
+    user_data["updated_ts"] = _now_ts()
+    return True
+
 def add_channel(
     canonical_id: str,
     channel: str,
@@ -249,26 +685,35 @@ def add_channel(
     """
     ws = _get_workspace(workspace)
     canonical_id = _sanitize_canonical_id(canonical_id)
-    identity_map = _load_identity_map(ws)
+    _check_lock_not_held(_get_identity_map_path(ws))
     
-    channel_id = f"{channel}:{provider_user_id}"
+    # Already mapped in the current file: nothing to write, skip the lock
+    user_data = _peek_identity_map(ws)["identities"].get(canonical_id)
+    if user_data and f"{channel}:{provider_user_id}" in user_data["channels"]:
+        return
     
-    # Create user if doesn't exist
-    if canonical_id not in identity_map["identities"]:
-        identity_map["identities"][canonical_id] = {
-            "canonical_id": canonical_id,
-            "is_owner": False,
-            "display_name": display_name or canonical_id.capitalize(),
-            "channels": [],
-            "created_at": datetime.now(timezone.utc).isoformat() + "Z",
-            "updated_at": datetime.now(timezone.utc).isoformat() + "Z"
-        }
+    with _identity_map_lock(_get_identity_map_path(ws)):
+        identity_map = _load_identity_map(ws)
+        if _add_channel_inplace(identity_map, canonical_id, channel, provider_user_id, display_name):
+            _save_identity_map(identity_map, ws)
+
+def add_channels(
+    entries: List[Tuple[str, str, str]],
+    workspace: Optional[str] = None,
+    display_name: Optional[str] = None
+) -> int:
+    """
+    Add many (canonical_id, channel, provider_user_id) mappings with one save.
     
-    # Add channel if not already present
-    if channel_id not in identity_map["identities"][canonical_id]["channels"]:
-        identity_map["identities"][canonical_id]["channels"].append(channel_id)
-        identity_map["identities"][canonical_id]["updated_at"] = datetime.now(timezone.utc).isoformat() + "Z"
-        _save_identity_map(identity_map, ws)
+    display_name applies to identities created by this call. All IDs are
+    validated before anything is written. Returns the number of mappings
+    that changed the map.
+    """
+    with IdentitySession(workspace) as session:
+        return sum(
+            session.add_channel(canonical_id, channel, provider_user_id, display_name)
+            for canonical_id, channel, provider_user_id in entries
+        )
 
 def remove_channel(
     canonical_id: str,
@@ -279,37 +724,125 @@ def remove_channel(
     """Remove channel mapping from canonical user."""
     ws = _get_workspace(workspace)
     canonical_id = _sanitize_canonical_id(canonical_id)
-    identity_map = _load_identity_map(ws)
+    _check_lock_not_held(_get_identity_map_path(ws))
     
-    channel_id = f"{channel}:{provider_user_id}"
+    # Not mapped in the current file: nothing to write, skip the lock
+    user_data = _peek_identity_map(ws)["identities"].get(canonical_id)
+    if not user_data or f"{channel}:{provider_user_id}" not in user_data["channels"]:
+        return
     
-    if canonical_id in identity_map["identities"]:
-        user_data = identity_map["identities"][canonical_id]
-        if channel_id in user_data["channels"]:
-            user_data["channels"].remove(channel_id)
-            user_data["updated_at"] = datetime.now(timezone.utc).isoformat() + "Z"
+    with _identity_map_lock(_get_identity_map_path(ws)):
+        identity_map = _load_identity_map(ws)
+        if _remove_channel_inplace(identity_map, canonical_id, channel, provider_user_id):
             _save_identity_map(identity_map, ws)
 
-def list_identities(workspace: Optional[str] = None) -> Dict:
-    """Return all identity mappings."""
+class IdentitySession:
+    """
+    Batch many mutations into one load and one save.
+    
+    Usage:
+        with IdentitySession(workspace) as session:
+            session.add_channel("alice", "discord", "alice#1234", "Alice")
+            session.remove_channel("bob", "telegram", "987654321")
+    
+    The map is written once on exit, and only if something changed and no
+    exception escaped the block (a failed batch leaves the file untouched).
+    The write lock is held for the whole block, so inside it use the
+    session's methods: add_channel/remove_channel/add_channels, a nested
+    session, or an owner-registering resolve_canonical_id for the same
+    workspace raise RuntimeError rather than have their update overwritten.
+    """
+    
+    def __init__(self, workspace: Optional[str] = None):
+        self.workspace = _get_workspace(workspace)
+        self.identity_map: Optional[Dict] = None
+        self.changed = False
+        self._resources: Optional[ExitStack] = None
+    
+    def __enter__(self) -> "IdentitySession":
+        with ExitStack() as stack:
+            stack.enter_context(_identity_map_lock(_get_identity_map_path(self.workspace)))
+            self.identity_map = _load_identity_map(self.workspace)
+            self._resources = stack.pop_all()
+        self.changed = False
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        try:
+            if exc_type is None and self.changed:
+                _save_identity_map(self.identity_map, self.workspace)
+        finally:
+            self._resources.close()
+            self._resources = None
+        return False
+    
+    def add_channel(
+        self,
+        canonical_id: str,
+        channel: str,
+        provider_user_id: str,
+        display_name: Optional[str] = None
+    ) -> bool:
+        """Add channel mapping in memory. Returns True if the map changed."""
+        canonical_id = _sanitize_canonical_id(canonical_id)
+        changed = _add_channel_inplace(self.identity_map, canonical_id, channel, provider_user_id, display_name)
+        self.changed = self.changed or changed
+        return changed
+    
+    def remove_channel(self, canonical_id: str, channel: str, provider_user_id: str) -> bool:
+        """Remove channel mapping in memory. Returns True if the map changed."""
+        canonical_id = _sanitize_canonical_id(canonical_id)
+        changed = _remove_channel_inplace(self.identity_map, canonical_id, channel, provider_user_id)
+        self.changed = self.changed or changed
+        return changed
+
+def list_identities(workspace: Optional[str] = None, iso: bool = False) -> Dict:
+    """
+    Return all identity mappings (channels as sorted lists).
+    
+    With iso=True, each record also gets created_at/updated_at ISO-8601
+    strings derived from the stored epoch timestamps.
+    """
+    ws = _get_workspace(workspace)
+    identities = _serializable_identities(_peek_identity_map(ws)["identities"])
+    if iso:
+        for user_data in identities.values():
+            for field in ("created", "updated"):
+                if isinstance(user_data.get(f"{field}_ts"), int):
+                    user_data[f"{field}_at"] = _iso_from_ts(user_data[f"{field}_ts"])
+    return identities
+
+def identity_exists(canonical_id: str, workspace: Optional[str] = None) -> bool:
+    """Check if a canonical ID is registered (no copy of the map)."""
     ws = _get_workspace(workspace)
-    return _load_identity_map(ws)["identities"]
+    canonical_id = _sanitize_canonical_id(canonical_id)
+    return canonical_id in _peek_identity_map(ws)["identities"]
+
+def get_identity(canonical_id: str, workspace: Optional[str] = None) -> Optional[Dict]:
+    """Return one identity record (channels as a sorted list), or None if unknown."""
+    ws = _get_workspace(workspace)
+    canonical_id = _sanitize_canonical_id(canonical_id)
+    user_data = _peek_identity_map(ws)["identities"].get(canonical_id)
+    
+    if user_data is None:
+        return None
+    return dict(user_data, channels=sorted(user_data.get("channels", ())))
 
 def get_channels(canonical_id: str, workspace: Optional[str] = None) -> List[str]:
-    """Get all channels for a canonical user."""
+    """Get all channels for a canonical user (sorted)."""
     ws = _get_workspace(workspace)
     canonical_id = _sanitize_canonical_id(canonical_id)
-    identity_map = _load_identity_map(ws)
+    identity_map = _peek_identity_map(ws)
     
     if canonical_id in identity_map["identities"]:
-        return identity_map["identities"][canonical_id].get("channels", [])
+        return sorted(identity_map["identities"][canonical_id].get("channels", ()))
     return []
 
 def is_owner(canonical_id: str, workspace: Optional[str] = None) -> bool:
     """Check if canonical ID is the owner."""
     ws = _get_workspace(workspace)
     canonical_id = _sanitize_canonical_id(canonical_id)
-    identity_map = _load_identity_map(ws)
+    identity_map = _peek_identity_map(ws)
     
     if canonical_id in identity_map["identities"]:
         return identity_map["identities"][canonical_id].get("is_owner", False)
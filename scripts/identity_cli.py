@@ -6,6 +6,7 @@ Commands:
   init              Initialize identity map
   resolve           Resolve channel:user_id to canonical ID
   add              Add channel mapping
+  add-batch        Add many channel mappings from JSONL (single save)
   remove           Remove channel mapping  
   list             List all identities
   channels         Get channels for canonical ID
@@ -30,8 +31,12 @@ from identity import (
     list_identities,
     get_channels,
     is_owner,
+    IdentitySession,
     _get_workspace,
-    _get_identity_map_path
+    _get_identity_map_path,
+    _empty_identity_map,
+    _save_identity_map,
+    _NAME_RE
 )
 
 def cmd_init(args):
@@ -44,10 +49,8 @@ def cmd_init(args):
         print("  Use --force to reinitialize")
         return 1
     
-    # Create empty map
-    map_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(map_path, 'w') as f:
-        json.dump({"version": "1.0", "identities": {}}, f, indent=2)
+    # Create empty map (atomic, so concurrent lock-free readers never see a partial file)
+    _save_identity_map(_empty_identity_map(), ws)
     
     print(f"✓ Initialized identity map at {map_path}")
     
@@ -55,8 +58,7 @@ def cmd_init(args):
     user_md = ws / "USER.md"
     if user_md.exists():
         content = user_md.read_text()
-        import re
-        name_match = re.search(r'\*\*Name:\*\*\s+(.+)', content)
+        name_match = _NAME_RE.search(content)
         if name_match:
             owner_name = name_match.group(1).split()[0].lower()
             print(f"✓ Owner canonical ID: {owner_name}")
@@ -83,8 +85,52 @@ def cmd_resolve(args):
     
     return 0
 
+def _add_batch(lines, args):
+    """
+    Apply JSONL mappings in one load/save.
+    
+    Each line: {"canonical": ..., "channel": ..., "user_id": ..., "display_name": ...}
+    Any invalid line aborts the whole batch before anything is written.
+    Only mappings that weren't already present are counted as added.
+    """
+    count = 0
+    with IdentitySession(args.workspace) as session:
+        for lineno, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+                canonical, channel, user_id = entry["canonical"], entry["channel"], entry["user_id"]
+            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                raise ValueError(f"line {lineno}: invalid mapping ({e})")
+            if not all(isinstance(field, str) for field in (canonical, channel, user_id)):
+                raise ValueError(f"line {lineno}: invalid mapping (canonical, channel and user_id must be strings)")
+            try:
+                count += session.add_channel(canonical, channel, user_id, entry.get("display_name"))
+            except ValueError as e:
+                raise ValueError(f"line {lineno}: {e}")
+    
+    if args.json:
+        print(json.dumps({"status": "added", "count": count}))
+    else:
+        print(f"✓ Added {count} channel mappings")
+    
+    return 0
+
+def cmd_add_batch(args):
+    """Add channel mappings from a JSONL file (or stdin) with a single save."""
+    if args.file == '-':
+        return _add_batch(sys.stdin, args)
+    
+    with open(args.file) as f:
+        return _add_batch(f, args)
+
 def cmd_add(args):
     """Add channel mapping."""
+    if args.batch:
+        return _add_batch(sys.stdin, args)
+    
     if not args.canonical or not args.channel or not args.user_id:
         print("✗ Error: --canonical, --channel, and --user-id required")
         return 1
@@ -115,7 +161,7 @@ def cmd_remove(args):
 
 def cmd_list(args):
     """List all identities."""
-    identities = list_identities(args.workspace)
+    identities = list_identities(args.workspace, iso=args.iso)
     
     if args.json:
         print(json.dumps(identities, indent=2))
@@ -129,9 +175,12 @@ def cmd_list(args):
             print(f"{canonical_id}{owner_badge}")
             if data.get("display_name"):
                 print(f"  Display Name: {data['display_name']}")
+            if args.iso:
+                print(f"  Created: {data.get('created_at', '-')}")
+                print(f"  Updated: {data.get('updated_at', '-')}")
             if data.get("channels"):
                 print(f"  Channels:")
-                for channel in sorted(data["channels"]):
+                for channel in data["channels"]:  # Already sorted
                     print(f"    - {channel}")
             print()
     
@@ -151,7 +200,7 @@ def cmd_channels(args):
         if not channels:
             print(f"No channels registered for {args.canonical}")
         else:
-            for channel in sorted(channels):
+            for channel in channels:  # Already sorted
                 print(channel)
     
     return 0
@@ -189,6 +238,9 @@ Examples:
   # Add channel mapping
   identity add --canonical alice --channel discord --user-id alice#1234
   
+  # Add many mappings at once (JSONL, one save)
+  identity add-batch --file mappings.jsonl
+  
   # List all identities
   identity list
   
@@ -216,10 +268,15 @@ Examples:
     
     # add
     p_add = subparsers.add_parser('add', help='Add channel mapping')
-    p_add.add_argument('--canonical', required=True, help='Canonical user ID')
-    p_add.add_argument('--channel', required=True, help='Channel name')
-    p_add.add_argument('--user-id', required=True, help='Provider user ID')
+    p_add.add_argument('--canonical', help='Canonical user ID')
+    p_add.add_argument('--channel', help='Channel name')
+    p_add.add_argument('--user-id', help='Provider user ID')
     p_add.add_argument('--display-name', help='Display name')
+    p_add.add_argument('--batch', action='store_true', help='Read JSONL mappings from stdin (same as add-batch)')
+    
+    # add-batch
+    p_add_batch = subparsers.add_parser('add-batch', help='Add many channel mappings from JSONL (single save)')
+    p_add_batch.add_argument('--file', default='-', help='JSONL file, one {"canonical", "channel", "user_id", "display_name"} per line (default: stdin)')
     
     # remove
     p_remove = subparsers.add_parser('remove', help='Remove channel mapping')
@@ -228,7 +285,8 @@ Examples:
     p_remove.add_argument('--user-id', required=True, help='Provider user ID')
     
     # list
-    subparsers.add_parser('list', help='List all identities')
+    p_list = subparsers.add_parser('list', help='List all identities')
+    p_list.add_argument('--iso', action='store_true', help='Include created/updated times as ISO-8601')
     
     # channels
     p_channels = subparsers.add_parser('channels', help='Get channels for canonical ID')
@@ -249,6 +307,7 @@ Examples:
         'init': cmd_init,
         'resolve': cmd_resolve,
         'add': cmd_add,
+        'add-batch': cmd_add_batch,
         'remove': cmd_remove,
         'list': cmd_list,
         'channels': cmd_channels,
@@ -15,44 +15,92 @@ import shutil
 import json
 import os
 import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Optional
+from unittest import mock
 
 # Import from parent scripts/ directory
 sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+import identity
 from identity import (
     resolve_canonical_id,
     add_channel,
+    add_channels,
     remove_channel,
     list_identities,
     get_channels,
     is_owner,
+    identity_exists,
+    get_identity,
+    IdentitySession,
     _sanitize_canonical_id,
     _load_identity_map,
     _save_identity_map
 )
 
-class TestIdentityResolver(unittest.TestCase):
-    """Test suite for identity-resolver core API."""
+def _add_channels_worker(workspace: str, worker: int):
+    """Process pool target (module level so it pickles): one add_channels batch."""
+    entries = [(f"user{i}", "telegram", f"{worker}{1000+i}") for i in range(10)]
+    add_channels(entries, workspace)
+
+# RAM-backed scratch space on Linux (tests are dominated by map writes);
+# None falls back to the platform temp dir
+TEST_TMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+
+class IdentityTestCase(unittest.TestCase):
+    """Shared fixture: one temp base per class, one workspace subdirectory per test."""
+    
+    # USER.md contents for each workspace (None: no USER.md)
+    USER_MD: Optional[str] = None
+    
+    @classmethod
+    def setUpClass(cls):
+        """Create one base directory (with the USER.md template, if any) for the whole class."""
+        # Durability is irrelevant for throwaway workspaces: skip fsync
+        cls.env_patch = mock.patch.dict(os.environ, {"OPENCLAW_IDENTITY_FSYNC": "0"})
+        cls.env_patch.start()
+        
+        cls.base_workspace = tempfile.mkdtemp(prefix="identity-test-", dir=TEST_TMP_DIR)
+        cls.user_md_template = Path(cls.base_workspace) / "USER.md"
+        if cls.USER_MD is not None:
+            cls.user_md_template.write_text(cls.USER_MD)
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Clean up the shared base directory."""
+        shutil.rmtree(cls.base_workspace, ignore_errors=True)
+        cls.env_patch.stop()
     
     def setUp(self):
-        """Create temporary workspace for each test."""
-        self.workspace = tempfile.mkdtemp(prefix="identity-test-")
+        """Give each test its own workspace subdirectory."""
+        self.workspace = os.path.join(self.base_workspace, self._testMethodName)
+        os.makedirs(self.workspace)
+        self.addCleanup(shutil.rmtree, self.workspace, ignore_errors=True)
         self.workspace_path = Path(self.workspace)
         
-        # Create USER.md with owner data
+        if self.USER_MD is None:
+            return
+        
+        # Hard-link the shared template (read-only for most tests); tests that
+        # edit USER.md call private_user_md() first
         user_md = self.workspace_path / "USER.md"
-        user_md.write_text("""# USER.md
-
-- **Name:** Test User
-- **Contact Numbers:** 
-  - **WhatsApp:** +1234567890 (primary)
-  - **Other:** +9876543210, +5555555555
-- **Telegram ID:** 123456789
-""")
+        try:
+            os.link(self.user_md_template, user_md)
+        except OSError:
+            shutil.copyfile(self.user_md_template, user_md)
     
-    def tearDown(self):
-        """Clean up temporary workspace."""
-        shutil.rmtree(self.workspace, ignore_errors=True)
+    def private_user_md(self) -> Path:
+        """Replace this test's USER.md link with a private copy that's safe to edit in place."""
+        user_md = self.workspace_path / "USER.md"
+        tmp_path = user_md.with_suffix(".copy")
+        shutil.copyfile(self.user_md_template, tmp_path)
+        os.replace(tmp_path, user_md)
+        return user_md
+
+class TestIdentityResolverCore(IdentityTestCase):
+    """Core API tests that never touch owner auto-registration (no USER.md)."""
     
     # === Sanitization Tests ===
     
@@ -72,6 +120,14 @@ class TestIdentityResolver(unittest.TestCase):
         self.assertEqual(_sanitize_canonical_id("user@example.com"), "userexamplecom")
         self.assertEqual(_sanitize_canonical_id("alice/bob"), "alicebob")
     
+    def test_sanitize_canonical_id_non_ascii(self):
+        """Test non-ASCII characters are dropped, not transliterated."""
+        self.assertEqual(_sanitize_canonical_id("Zoë"), "zo")
+        self.assertEqual(_sanitize_canonical_id("İvan"), "ivan")
+        self.assertEqual(_sanitize_canonical_id("\u212Aim"), "kim")  # Kelvin sign lowercases to "k"
+        with self.assertRaisesRegex(ValueError, "^Invalid canonical_id: 日本$"):
+            _sanitize_canonical_id("日本")
+    
     def test_sanitize_canonical_id_path_traversal(self):
         """Test path traversal patterns sanitized safely."""
         # Path traversal characters removed → safe
@@ -93,43 +149,6 @@ class TestIdentityResolver(unittest.TestCase):
         sanitized = _sanitize_canonical_id(long_id)
         self.assertLessEqual(len(sanitized), 64)
     
-    # === Auto-Registration Tests ===
-    
-    def test_resolve_owner_auto_register_telegram(self):
-        """Test owner auto-registers from Telegram ID."""
-        canonical_id = resolve_canonical_id("telegram", "123456789", self.workspace)
-        self.assertEqual(canonical_id, "test")  # From USER.md name
-        
-        # Verify registered
-        identities = list_identities(self.workspace)
-        self.assertIn("test", identities)
-        self.assertTrue(identities["test"]["is_owner"])
-        self.assertIn("telegram:123456789", identities["test"]["channels"])
-    
-    def test_resolve_owner_auto_register_whatsapp(self):
-        """Test owner auto-registers from WhatsApp number."""
-        canonical_id = resolve_canonical_id("whatsapp", "+1234567890", self.workspace)
-        self.assertEqual(canonical_id, "test")
-        
-        # Verify all owner numbers work
-        self.assertEqual(resolve_canonical_id("whatsapp", "+9876543210", self.workspace), "test")
-        self.assertEqual(resolve_canonical_id("whatsapp", "+5555555555", self.workspace), "test")
-    
-    def test_resolve_owner_multiple_channels_same_canonical(self):
-        """Test multiple owner channels resolve to same canonical ID."""
-        id1 = resolve_canonical_id("telegram", "123456789", self.workspace)
-        id2 = resolve_canonical_id("whatsapp", "+1234567890", self.workspace)
-        id3 = resolve_canonical_id("whatsapp", "+9876543210", self.workspace)
-        
-        self.assertEqual(id1, id2)
-        self.assertEqual(id2, id3)
-        
-        # Verify all channels in one identity
-        channels = get_channels(id1, self.workspace)
-        self.assertIn("telegram:123456789", channels)
-        self.assertIn("whatsapp:+1234567890", channels)
-        self.assertIn("whatsapp:+9876543210", channels)
-    
     # === Stranger Fallback Tests ===
     
     def test_resolve_stranger_unmapped(self):
@@ -137,21 +156,16 @@ class TestIdentityResolver(unittest.TestCase):
         canonical_id = resolve_canonical_id("discord", "unknown#1234", self.workspace)
         self.assertEqual(canonical_id, "stranger:discord:unknown#1234")
     
-    def test_resolve_stranger_not_owner(self):
-        """Test non-owner number returns stranger format."""
-        canonical_id = resolve_canonical_id("whatsapp", "+9999999999", self.workspace)
-        self.assertEqual(canonical_id, "stranger:whatsapp:+9999999999")
-    
     # === Add/Remove Channel Tests ===
     
     def test_add_channel_new_user(self):
         """Test adding channel creates new user."""
         add_channel("alice", "discord", "alice#1234", self.workspace, "Alice")
         
-        identities = list_identities(self.workspace)
-        self.assertIn("alice", identities)
-        self.assertEqual(identities["alice"]["display_name"], "Alice")
-        self.assertIn("discord:alice#1234", identities["alice"]["channels"])
+        alice = get_identity("alice", self.workspace)
+        self.assertIsNotNone(alice)
+        self.assertEqual(alice["display_name"], "Alice")
+        self.assertIn("discord:alice#1234", alice["channels"])
     
     def test_add_channel_existing_user(self):
         """Test adding channel to existing user."""
@@ -162,6 +176,20 @@ class TestIdentityResolver(unittest.TestCase):
         self.assertIn("telegram:123456", channels)
         self.assertIn("whatsapp:+1234567890", channels)
     
+    def test_duplicate_channels_on_disk_collapsed(self):
+        """Test duplicate entries in a hand-edited channels list are merged."""
+        map_path = self.workspace_path / "data" / "identity-map.json"
+        map_path.parent.mkdir(parents=True, exist_ok=True)
+        map_path.write_text(json.dumps({"version": "1.0", "identities": {"ivy": {
+            "canonical_id": "ivy", "is_owner": False,
+            "channels": ["telegram:5", "telegram:5", "discord:ivy#1"]}}}))
+        
+        self.assertEqual(get_channels("ivy", self.workspace), ["discord:ivy#1", "telegram:5"])
+        
+        add_channel("ivy", "whatsapp", "+5", self.workspace)
+        stored = json.loads(map_path.read_text())["identities"]["ivy"]["channels"]
+        self.assertEqual(stored, ["discord:ivy#1", "telegram:5", "whatsapp:+5"])
+    
     def test_add_channel_idempotent(self):
         """Test adding same channel twice is idempotent."""
         add_channel("carol", "discord", "carol#5678", self.workspace)
@@ -170,6 +198,42 @@ class TestIdentityResolver(unittest.TestCase):
         channels = get_channels("carol", self.workspace)
         self.assertEqual(channels.count("discord:carol#5678"), 1)
     
+    def test_add_channel_timestamps_iso8601(self):
+        """Test timestamps are stored as epoch ints and rendered as ISO-8601 on request."""
+        add_channel("vera", "telegram", "909", self.workspace)
+        
+        record = list_identities(self.workspace)["vera"]
+        self.assertIsInstance(record["created_ts"], int)
+        self.assertNotIn("created_at", record)
+        
+        record = list_identities(self.workspace, iso=True)["vera"]
+        for field in ("created_at", "updated_at"):
+            self.assertRegex(record[field], r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z$")
+    
+    def test_legacy_iso_timestamps_migrated(self):
+        """Test maps with ISO created_at/updated_at strings load as epoch timestamps."""
+        map_path = self.workspace_path / "data" / "identity-map.json"
+        map_path.parent.mkdir(parents=True, exist_ok=True)
+        map_path.write_text(json.dumps({"version": "1.0", "identities": {"zed": {
+            "canonical_id": "zed", "is_owner": False, "channels": ["telegram:1"],
+            "created_at": "2026-01-15T10:00:00+00:00Z", "updated_at": "2026-01-15T10:05:00Z"}}}))
+        
+        record = list_identities(self.workspace, iso=True)["zed"]
+        self.assertEqual(record["created_ts"], 1768471200)
+        self.assertEqual(record["updated_ts"], 1768471500)
+        self.assertEqual(record["created_at"], "2026-01-15T10:00:00Z")
+    
+    def test_channels_saved_sorted(self):
+        """Test channels are stored as a sorted list regardless of add order."""
+        add_channel("amy", "whatsapp", "+333", self.workspace)
+        add_channel("amy", "discord", "amy#1", self.workspace)
+        add_channel("amy", "telegram", "333", self.workspace)
+        
+        map_path = self.workspace_path / "data" / "identity-map.json"
+        stored = json.loads(map_path.read_text())["identities"]["amy"]["channels"]
+        self.assertEqual(stored, ["discord:amy#1", "telegram:333", "whatsapp:+333"])
+        self.assertEqual(get_channels("amy", self.workspace), stored)
+    
     def test_remove_channel(self):
         """Test removing channel mapping."""
         add_channel("dave", "telegram", "999999", self.workspace)
@@ -199,8 +263,10 @@ class TestIdentityResolver(unittest.TestCase):
         add_channel("bob", "whatsapp", "+222", self.workspace)
         
         identities = list_identities(self.workspace)
-        self.assertIn("alice", identities)
-        self.assertIn("bob", identities)
+        self.assertEqual(sorted(identities), ["alice", "bob"])
+        self.assertTrue(identity_exists("alice", self.workspace))
+        self.assertTrue(identity_exists("bob", self.workspace))
+        self.assertFalse(identity_exists("carol", self.workspace))
     
     def test_get_channels_existing_user(self):
         """Test getting channels for existing user."""
@@ -212,6 +278,18 @@ class TestIdentityResolver(unittest.TestCase):
         self.assertIn("telegram:123", channels)
         self.assertIn("discord:frank#456", channels)
     
+    def test_get_identity_returns_private_record(self):
+        """Test get_identity returns a copy of one record, or None."""
+        add_channel("hana", "telegram", "404", self.workspace, "Hana")
+        
+        record = get_identity("hana", self.workspace)
+        record["channels"].append("discord:hana#1")
+        record["display_name"] = "Changed"
+        
+        self.assertEqual(get_identity("hana", self.workspace)["channels"], ["telegram:404"])
+        self.assertEqual(get_identity("hana", self.workspace)["display_name"], "Hana")
+        self.assertIsNone(get_identity("nobody", self.workspace))
+    
     def test_get_channels_nonexistent_user(self):
         """Test getting channels for nonexistent user."""
         channels = get_channels("grace", self.workspace)
@@ -219,11 +297,6 @@ class TestIdentityResolver(unittest.TestCase):
     
     # === Ownership Tests ===
     
-    def test_is_owner_true(self):
-        """Test is_owner returns True for owner."""
-        resolve_canonical_id("telegram", "123456789", self.workspace)  # Auto-register owner
-        self.assertTrue(is_owner("test", self.workspace))
-    
     def test_is_owner_false(self):
         """Test is_owner returns False for non-owner."""
         add_channel("henry", "telegram", "888", self.workspace)
@@ -236,22 +309,420 @@ class TestIdentityResolver(unittest.TestCase):
     # === Thread Safety Tests ===
     
     def test_concurrent_add_channels(self):
-        """Test concurrent adds don't corrupt map (basic check)."""
-        import threading
+        """Test concurrent adds from separate processes don't corrupt or lose updates."""
+        with ProcessPoolExecutor(max_workers=3) as pool:
+            list(pool.map(_add_channels_worker, [self.workspace] * 3, range(3)))
+        
+        # Verify map is valid JSON and every process's batch landed
+        identities = list_identities(self.workspace)
+        self.assertIsInstance(identities, dict)
+        self.assertEqual(len(identities), 10)
+        for i in range(10):
+            self.assertEqual(len(identities[f"user{i}"]["channels"]), 3)
+    
+    # === Session Tests ===
+    
+    def test_session_batches_into_single_save(self):
+        """Test session applies all mutations with one write."""
+        map_path = self.workspace_path / "data" / "identity-map.json"
+        
+        with IdentitySession(self.workspace) as session:
+            session.add_channel("olivia", "telegram", "101", "Olivia")
+            session.add_channel("olivia", "discord", "olivia#1")
+            session.add_channel("paul", "whatsapp", "+202")
+            session.remove_channel("olivia", "telegram", "101")
+            self.assertFalse(map_path.exists())  # Nothing written yet
+        
+        self.assertEqual(get_channels("olivia", self.workspace), ["discord:olivia#1"])
+        self.assertEqual(get_channels("paul", self.workspace), ["whatsapp:+202"])
+        self.assertEqual(resolve_canonical_id("whatsapp", "+202", self.workspace), "paul")
+    
+    def test_session_discards_changes_on_error(self):
+        """Test a failing session leaves the map untouched."""
+        add_channel("quinn", "telegram", "303", self.workspace)
+        
+        with self.assertRaises(ValueError):
+            with IdentitySession(self.workspace) as session:
+                session.add_channel("quinn", "discord", "quinn#1")
+                session.add_channel("...", "discord", "bad#1")  # Invalid canonical ID
+        
+        self.assertEqual(get_channels("quinn", self.workspace), ["telegram:303"])
+    
+    def test_session_rejects_nested_mutations(self):
+        """Test public mutators inside an open session raise instead of losing updates."""
+        add_channel("ruth", "telegram", "1", self.workspace)
+        nested = [
+            lambda: add_channel("sara", "telegram", "2", self.workspace),
+            lambda: add_channels([("sara", "telegram", "2")], self.workspace),
+            lambda: remove_channel("ruth", "telegram", "1", self.workspace),
+            lambda: IdentitySession(self.workspace).__enter__(),
+        ]
+        
+        for call in nested:
+            with IdentitySession(self.workspace) as session:
+                session.add_channel("ruth", "discord", "ruth#1")
+                with self.assertRaises(RuntimeError):
+                    call()
+        
+        # Every session still saved its own change; the lock was released
+        self.assertEqual(get_channels("ruth", self.workspace), ["discord:ruth#1", "telegram:1"])
+        self.assertFalse(identity_exists("sara", self.workspace))
+        add_channel("sara", "telegram", "2", self.workspace)
+        self.assertTrue(identity_exists("sara", self.workspace))
+    
+    def test_save_without_fsync(self):
+        """Test OPENCLAW_IDENTITY_FSYNC=0 still saves the map."""
+        with mock.patch.dict(os.environ, {"OPENCLAW_IDENTITY_FSYNC": "0"}), \
+                mock.patch.object(identity, "_fsync") as fsync:
+            add_channel("rose", "telegram", "404", self.workspace)
+        
+        fsync.assert_not_called()
+        self.assertEqual(get_channels("rose", self.workspace), ["telegram:404"])
+    
+    def test_save_with_fsync(self):
+        """Test the default durable save fsyncs the file and its directory."""
+        with mock.patch.dict(os.environ, {"OPENCLAW_IDENTITY_FSYNC": "1"}), \
+                mock.patch.object(identity, "_fsync", wraps=identity._fsync) as fsync:
+            add_channel("seth", "telegram", "405", self.workspace)
+        
+        self.assertEqual(fsync.call_count, 2)
+        self.assertEqual(get_channels("seth", self.workspace), ["telegram:405"])
+    
+    # === Channel Index Tests ===
+    
+    def test_resolve_mapped_channel_via_index(self):
+        """Test manually added channels resolve to their canonical ID."""
+        add_channel("mia", "discord", "mia#4242", self.workspace)
+        self.assertEqual(resolve_canonical_id("discord", "mia#4242", self.workspace), "mia")
+        
+        remove_channel("mia", "discord", "mia#4242", self.workspace)
+        self.assertEqual(
+            resolve_canonical_id("discord", "mia#4242", self.workspace),
+            "stranger:discord:mia#4242"
+        )
+    
+    def test_channel_index_not_persisted(self):
+        """Test derived lookup structures stay out of the map file."""
+        add_channel("noah", "telegram", "4444", self.workspace)
+        
+        map_path = self.workspace_path / "data" / "identity-map.json"
+        data = json.loads(map_path.read_text())
+        self.assertEqual(set(data), {"version", "identities"})
+    
+    # === Workspace Tests ===
+    
+    def test_relative_workspace_follows_cwd(self):
+        """Test memoized relative workspace paths track the current directory."""
+        for name in ("one", "two"):
+            (self.workspace_path / name / "ws").mkdir(parents=True)
+        
+        old_cwd = os.getcwd()
+        self.addCleanup(os.chdir, old_cwd)
+        
+        os.chdir(self.workspace_path / "one")
+        add_channel("xena", "telegram", "1", "ws")
+        os.chdir(self.workspace_path / "two")
+        add_channel("yuri", "telegram", "2", "ws")
+        
+        self.assertEqual(list(list_identities(str(self.workspace_path / "one" / "ws"))), ["xena"])
+        self.assertEqual(list(list_identities(str(self.workspace_path / "two" / "ws"))), ["yuri"])
+    
+    # === Cache Tests ===
+    
+    def test_load_identity_map_returns_independent_copies(self):
+        """Test mutating a loaded map doesn't leak into the cache."""
+        add_channel("kate", "telegram", "777", self.workspace)
+        
+        first = _load_identity_map(Path(self.workspace))
+        first["identities"]["kate"]["channels"].add("discord:kate#1")
+        first["identities"].pop("kate")
+        
+        second = _load_identity_map(Path(self.workspace))
+        self.assertEqual(second["identities"]["kate"]["channels"], {"telegram:777"})
+    
+    def test_repeated_reads_parse_once(self):
+        """Test back-to-back reads of an unchanged map skip the JSON parse."""
+        add_channel("nora", "telegram", "313", self.workspace)
+        map_path = self.workspace_path / "data" / "identity-map.json"
+        os.utime(map_path)  # Force one re-parse after the save
         
-        def add_channels():
+        with mock.patch.object(identity, "_json_loads", wraps=identity._json_loads) as loads:
+            for _ in range(5):
+                resolve_canonical_id("telegram", "313", self.workspace)
+                get_channels("nora", self.workspace)
+                is_owner("nora", self.workspace)
+                list_identities(self.workspace)
+                _load_identity_map(self.workspace_path)
+        
+        self.assertEqual(loads.call_count, 1)
+    
+    def test_get_channels_returns_private_list(self):
+        """Test callers can't corrupt the shared cached map via get_channels."""
+        add_channel("zoe", "telegram", "222", self.workspace)
+        
+        get_channels("zoe", self.workspace).append("discord:zoe#1")
+        
+        self.assertEqual(get_channels("zoe", self.workspace), ["telegram:222"])
+    
+    def test_load_identity_map_sees_external_writes(self):
+        """Test cache is invalidated when the file changes on disk."""
+        add_channel("liam", "telegram", "555", self.workspace)
+        list_identities(self.workspace)  # Warm cache
+        
+        # Simulate another process rewriting the map
+        map_path = self.workspace_path / "data" / "identity-map.json"
+        data = json.loads(map_path.read_text())
+        data["identities"]["liam"]["channels"].append("discord:liam#2")
+        tmp_path = map_path.with_suffix(".ext")
+        tmp_path.write_text(json.dumps(data))
+        os.replace(tmp_path, map_path)
+        
+        self.assertIn("discord:liam#2", get_channels("liam", self.workspace))
+    
+    def test_save_identity_map_skips_unchanged_content(self):
+        """Test saving an unchanged map doesn't rewrite the file."""
+        add_channel("sam", "telegram", "606", self.workspace)
+        map_path = self.workspace_path / "data" / "identity-map.json"
+        before = os.stat(map_path)
+        
+        _save_identity_map(_load_identity_map(Path(self.workspace)), Path(self.workspace))
+        
+        after = os.stat(map_path)
+        self.assertEqual((before.st_ino, before.st_mtime_ns), (after.st_ino, after.st_mtime_ns))
+    
+    def test_legacy_memory_map_location(self):
+        """Test memory/identity-map.json is used when data/ has no map."""
+        legacy_path = self.workspace_path / "memory" / "identity-map.json"
+        legacy_path.parent.mkdir()
+        legacy_path.write_text(json.dumps({
+            "version": "1.0",
+            "identities": {"uma": {"canonical_id": "uma", "channels": ["telegram:808"]}}
+        }))
+        
+        self.assertEqual(resolve_canonical_id("telegram", "808", self.workspace), "uma")
+        add_channel("uma", "discord", "uma#1", self.workspace)
+        
+        self.assertIn("discord:uma#1", json.loads(legacy_path.read_text())["identities"]["uma"]["channels"])
+        self.assertFalse((self.workspace_path / "data" / "identity-map.json").exists())
+    
+    def test_failed_save_leaves_no_temp_file(self):
+        """Test a write error cleans up the temp file and keeps the old map."""
+        add_channel("will", "telegram", "111", self.workspace)
+        
+        with mock.patch.object(identity, "_write_all", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                add_channel("will", "discord", "will#1", self.workspace)
+        
+        self.assertFalse((self.workspace_path / "data" / "identity-map.tmp").exists())
+        self.assertEqual(get_channels("will", self.workspace), ["telegram:111"])
+    
+    def test_stdlib_json_fallback(self):
+        """Test maps round-trip without orjson installed."""
+        with mock.patch.object(identity, "orjson", None):
+            add_channel("tina", "discord", "tina#7", self.workspace, "Tina")
+        
+        # Readable by whichever codec is active
+        identity._MAP_CACHE.clear()
+        self.assertEqual(get_channels("tina", self.workspace), ["discord:tina#7"])
+    
+    @unittest.skipIf(identity.orjson is None, "orjson not installed")
+    def test_json_codecs_emit_identical_bytes(self):
+        """Test orjson and stdlib json serialize maps byte-for-byte the same."""
+        add_channel("zoe", "telegram", "1", self.workspace, "Zoë ☃")
+        data = _load_identity_map(self.workspace_path)
+        persisted = {"version": data["version"], "identities": identity._serializable_identities(data["identities"])}
+        
+        fast = identity._json_dumps(persisted)
+        with mock.patch.object(identity, "orjson", None):
+            self.assertEqual(identity._json_dumps(persisted), fast)
+    
+    @unittest.skipIf(identity.msgpack is None, "msgpack not installed")
+    def test_msgpack_format_round_trip(self):
+        """Test OPENCLAW_IDENTITY_FORMAT=msgpack saves binary maps that load back."""
+        with mock.patch.dict(os.environ, {"OPENCLAW_IDENTITY_FORMAT": "msgpack"}):
+            add_channel("vic", "telegram", "12", self.workspace, "Vic")
+        
+        map_path = self.workspace_path / "data" / "identity-map.json"
+        self.assertNotEqual(map_path.read_bytes()[:1], b"{")
+        
+        # Format is sniffed on load, regardless of the variable
+        identity._MAP_CACHE.clear()
+        self.assertEqual(get_channels("vic", self.workspace), ["telegram:12"])
+        add_channel("vic", "discord", "vic#1", self.workspace)
+        self.assertEqual(json.loads(map_path.read_text())["identities"]["vic"]["channels"],
+                         ["discord:vic#1", "telegram:12"])
+    
+    def test_msgpack_map_without_msgpack_raises(self):
+        """Test a binary map is never silently treated as empty."""
+        map_path = self.workspace_path / "data" / "identity-map.json"
+        map_path.parent.mkdir(parents=True, exist_ok=True)
+        map_path.write_bytes(b"\x82\xa7version\xa31.0\xaaidentities\x80")
+        
+        with mock.patch.object(identity, "msgpack", None):
+            with self.assertRaises(RuntimeError):
+                list_identities(self.workspace)
+    
+    def test_damaged_map_not_mistaken_for_msgpack(self):
+        """Test zero-filled or BOM-prefixed maps take the JSON path, not the msgpack error."""
+        map_path = self.workspace_path / "data" / "identity-map.json"
+        map_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        for raw in (b"\x00" * 64, b"\xef\xbb\xbf{\"version\": \"1.0\", \"identities\": {}}"):
+            map_path.write_bytes(raw)
+            with mock.patch.object(identity, "msgpack", None):
+                self.assertEqual(
+                    resolve_canonical_id("discord", "x", self.workspace),
+                    "stranger:discord:x"
+                )
+    
+    def test_concurrent_add_channels_no_lost_updates(self):
+        """Test concurrent writers serialize instead of overwriting each other."""
+        def add_many(worker):
             for i in range(10):
-                add_channel(f"user{i}", "telegram", str(1000+i), self.workspace)
+                add_channel(f"w{worker}-user{i}", "telegram", f"{worker}{i:03d}", self.workspace)
         
-        threads = [threading.Thread(target=add_channels) for _ in range(3)]
+        threads = [threading.Thread(target=add_many, args=(w,)) for w in range(4)]
         for t in threads:
             t.start()
         for t in threads:
             t.join()
         
-        # Verify map is valid JSON
+        self.assertEqual(len(list_identities(self.workspace)), 40)
+    
+    def test_noop_writes_skip_lock(self):
+        """Test adds/removes that change nothing never contend for the write lock."""
+        add_channel("uma", "telegram", "808", self.workspace)
+        
+        with mock.patch.object(identity, "_identity_map_lock", side_effect=AssertionError("lock taken")):
+            add_channel("uma", "telegram", "808", self.workspace)
+            remove_channel("uma", "discord", "uma#1", self.workspace)
+            remove_channel("nobody", "telegram", "808", self.workspace)
+        
+        self.assertEqual(get_channels("uma", self.workspace), ["telegram:808"])
+
+class TestIdentityResolverOwner(IdentityTestCase):
+    """Owner auto-registration tests (workspace has a USER.md)."""
+    
+    USER_MD = """# USER.md
+
+- **Name:** Test User
+- **Contact Numbers:** 
+  - **WhatsApp:** +1234567890 (primary)
+  - **Other:** +9876543210, +5555555555
+- **Telegram ID:** 123456789
+"""
+    
+    # === Auto-Registration Tests ===
+    
+    def test_resolve_with_blank_owner_name(self):
+        """Test a whitespace-only **Name:** neither breaks resolves nor names the owner."""
+        user_md = self.private_user_md()
+        user_md.write_text("# USER.md\n\n- **Telegram ID:** 123456789\n- **Name:**    ")
+        
+        self.assertEqual(resolve_canonical_id("discord", "x", self.workspace), "stranger:discord:x")
+        self.assertEqual(resolve_canonical_id("telegram", "123456789", self.workspace), "owner")
+        self.assertTrue(is_owner("owner", self.workspace))
+    
+    def test_resolve_owner_auto_register_telegram(self):
+        """Test owner auto-registers from Telegram ID."""
+        canonical_id = resolve_canonical_id("telegram", "123456789", self.workspace)
+        self.assertEqual(canonical_id, "test")  # From USER.md name
+        
+        # Verify registered
         identities = list_identities(self.workspace)
-        self.assertIsInstance(identities, dict)
+        self.assertIn("test", identities)
+        self.assertTrue(identities["test"]["is_owner"])
+        self.assertIn("telegram:123456789", identities["test"]["channels"])
+    
+    def test_resolve_owner_auto_register_whatsapp(self):
+        """Test owner auto-registers from WhatsApp number."""
+        canonical_id = resolve_canonical_id("whatsapp", "+1234567890", self.workspace)
+        self.assertEqual(canonical_id, "test")
+        
+        # Verify all owner numbers work
+        self.assertEqual(resolve_canonical_id("whatsapp", "+9876543210", self.workspace), "test")
+        self.assertEqual(resolve_canonical_id("whatsapp", "+5555555555", self.workspace), "test")
+    
+    def test_resolve_owner_multiple_channels_same_canonical(self):
+        """Test multiple owner channels resolve to same canonical ID."""
+        id1 = resolve_canonical_id("telegram", "123456789", self.workspace)
+        id2 = resolve_canonical_id("whatsapp", "+1234567890", self.workspace)
+        id3 = resolve_canonical_id("whatsapp", "+9876543210", self.workspace)
+        
+        self.assertEqual(id1, id2)
+        self.assertEqual(id2, id3)
+        
+        # Verify all channels in one identity
+        channels = get_channels(id1, self.workspace)
+        self.assertIn("telegram:123456789", channels)
+        self.assertIn("whatsapp:+1234567890", channels)
+        self.assertIn("whatsapp:+9876543210", channels)
+    
+    def test_user_md_parsed_once_across_resolves(self):
+        """Test repeated owner/stranger probes read USER.md only once."""
+        real_read_text = Path.read_text
+        with mock.patch.object(Path, "read_text", autospec=True, side_effect=real_read_text) as read_text:
+            resolve_canonical_id("whatsapp", "+1234567890", self.workspace)
+            resolve_canonical_id("whatsapp", "+9876543210", self.workspace)
+            resolve_canonical_id("telegram", "000", self.workspace)
+            resolve_canonical_id("discord", "nobody#1", self.workspace)
+        
+        self.assertEqual(read_text.call_count, 1)
+    
+    def test_resolve_owner_picks_up_user_md_changes(self):
+        """Test edits to USER.md are seen despite the parse cache."""
+        user_md = self.private_user_md()
+        self.assertEqual(
+            resolve_canonical_id("whatsapp", "+4444444444", self.workspace),
+            "stranger:whatsapp:+4444444444"
+        )
+        
+        user_md.write_text(user_md.read_text() + "- **Phone:** +4444444444\n")
+        
+        self.assertEqual(resolve_canonical_id("whatsapp", "+4444444444", self.workspace), "test")
+    
+    # === Stranger Fallback Tests ===
+    
+    def test_resolve_stranger_not_owner(self):
+        """Test non-owner number returns stranger format."""
+        canonical_id = resolve_canonical_id("whatsapp", "+9999999999", self.workspace)
+        self.assertEqual(canonical_id, "stranger:whatsapp:+9999999999")
+    
+    def test_resolve_stranger_number_outside_contact_lines(self):
+        """Test numbers on non-contact USER.md lines don't grant owner."""
+        user_md = self.private_user_md()
+        user_md.write_text(user_md.read_text() + "- **Notes:** order #31415926 shipped\n")
+        
+        canonical_id = resolve_canonical_id("telegram", "31415926", self.workspace)
+        self.assertEqual(canonical_id, "stranger:telegram:31415926")
+    
+    # === Ownership Tests ===
+    
+    def test_is_owner_true(self):
+        """Test is_owner returns True for owner."""
+        resolve_canonical_id("telegram", "123456789", self.workspace)  # Auto-register owner
+        self.assertTrue(is_owner("test", self.workspace))
+    
+    # === Channel Index Tests ===
+    
+    def test_owner_registration_inside_session_raises(self):
+        """Test an owner-registering resolve can't overwrite (or be overwritten by) a session."""
+        with IdentitySession(self.workspace) as session:
+            session.add_channel("kim", "telegram", "5")
+            with self.assertRaises(RuntimeError):
+                resolve_canonical_id("telegram", "123456789", self.workspace)
+        
+        self.assertEqual(sorted(list_identities(self.workspace)), ["kim"])
+        self.assertEqual(resolve_canonical_id("telegram", "123456789", self.workspace), "test")
+    
+    def test_resolve_registered_owner_skips_owner_detection(self):
+        """Test resolves of already-registered owner numbers are pure index lookups."""
+        for number in ("+1234567890", "+9876543210", "+5555555555"):
+            resolve_canonical_id("whatsapp", number, self.workspace)
+        
+        with mock.patch.object(identity, "_load_owner_info", side_effect=AssertionError("USER.md read")):
+            for number in ("+1234567890", "+9876543210", "+5555555555"):
+                self.assertEqual(resolve_canonical_id("whatsapp", number, self.workspace), "test")
     
     # === Integration Tests ===
     
@@ -264,29 +735,33 @@ class TestIdentityResolver(unittest.TestCase):
         # Add another user
         add_channel("julia", "discord", "julia#9999", self.workspace, "Julia")
         
-        # List all
-        identities = list_identities(self.workspace)
-        self.assertEqual(len(identities), 2)
+        # List all (one snapshot per phase; assertions read the snapshot)
+        snapshot = list_identities(self.workspace)
+        self.assertEqual(len(snapshot), 2)
         
         # Verify owner
-        self.assertTrue(is_owner(owner_id, self.workspace))
-        self.assertFalse(is_owner("julia", self.workspace))
+        self.assertTrue(snapshot[owner_id]["is_owner"])
+        self.assertFalse(snapshot["julia"]["is_owner"])
         
         # Add channel to existing user
         add_channel("julia", "whatsapp", "+5555555555", self.workspace)
-        channels = get_channels("julia", self.workspace)
-        self.assertEqual(len(channels), 2)
+        snapshot = list_identities(self.workspace)
+        self.assertEqual(len(snapshot["julia"]["channels"]), 2)
         
         # Remove channel
         remove_channel("julia", "discord", "julia#9999", self.workspace)
-        channels = get_channels("julia", self.workspace)
-        self.assertEqual(len(channels), 1)
+        snapshot = list_identities(self.workspace)
+        self.assertEqual(snapshot["julia"]["channels"], ["whatsapp:+5555555555"])
 
 def run_tests():
     """Run all tests and print summary."""
     loader = unittest.TestLoader()
-    suite = loader.loadTestsFromTestCase(TestIdentityResolver)
-    runner = unittest.TextTestRunner(verbosity=2)
+    suite = unittest.TestSuite(
+        loader.loadTestsFromTestCase(case)
+        for case in (TestIdentityResolverCore, TestIdentityResolverOwner)
+    )
+    # Dots instead of a line per test; output of passing tests is discarded
+    runner = unittest.TextTestRunner(verbosity=1, buffer=True)
     result = runner.run(suite)
     
     print("\n" + "="*70)